@@ -0,0 +1,8 @@
+"""Process-wide environment setup, shared by every module that needs it."""
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file.
+# Modules import this instead of calling load_dotenv() themselves, so the
+# .env file is parsed once per process however many of them are imported.
+load_dotenv()
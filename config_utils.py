@@ -0,0 +1,52 @@
+"""
+Helpers for reading configuration values and search parameters.
+Kept free of heavy imports (Streamlit, Tavily, LangChain) so configuration.py stays cheap to import.
+"""
+from typing import Any, Dict, Optional
+
+# Limits on how much raw content the formatted sources put into a prompt.
+# Accepted alongside the search parameters, but never sent to the search API.
+_SOURCE_BUDGET_PARAMS = frozenset({"per_source_char_cap", "total_char_budget"})
+
+# Parameters accepted by each search API, used by get_search_params
+# Simplified to only include Tavily
+_SEARCH_API_PARAMS: Dict[str, frozenset[str]] = {
+    "tavily": frozenset({"max_results", "topic", "include_raw_content", "search_depth", "include_answer", "include_images", "include_domains", "exclude_domains"}) | _SOURCE_BUDGET_PARAMS,
+}
+
+def get_config_value(value: Any) -> Any:
+    """
+    Helper function to handle string, dict, and enum cases of configuration values.
+    Enums are expected to have a 'value' attribute.
+    """
+    if isinstance(value, str):
+        return value
+    elif isinstance(value, dict):
+        return value
+    elif hasattr(value, 'value'): # Check if it's an Enum-like object with a .value
+        return value.value
+    return value # Fallback for other types
+
+def get_search_params(search_api: str, search_api_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Filters the search_api_config dictionary to include only parameters accepted by the specified search API.
+    Currently, only Tavily is supported.
+
+    Args:
+        search_api (str): The search API identifier (should be "tavily").
+        search_api_config (Optional[Dict[str, Any]]): The configuration dictionary for the search API.
+
+    Returns:
+        Dict[str, Any]: A dictionary of parameters to pass to the search function.
+    """
+    accepted_params = _SEARCH_API_PARAMS.get(search_api, frozenset())
+    return {k: v for k, v in (search_api_config or {}).items() if k in accepted_params}
+
+def split_source_budget(params: Dict[str, Any]) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Splits parameters from get_search_params into (search API parameters, source budget parameters).
+    The budget parameters (per_source_char_cap, total_char_budget) go to tavily_search or format_source_docs.
+    """
+    search_params = {k: v for k, v in params.items() if k not in _SOURCE_BUDGET_PARAMS}
+    budget_params = {k: v for k, v in params.items() if k in _SOURCE_BUDGET_PARAMS}
+    return search_params, budget_params
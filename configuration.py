@@ -1,14 +1,18 @@
 import os
 from enum import Enum
-from typing import Any, Optional, Dict
+from functools import cached_property, lru_cache
+from typing import Any, Optional, Dict, Union, get_args, get_origin
 
 from langchain_core.language_models.chat_models import BaseChatModel # Assuming this might be used elsewhere or by Langchain internally
 from langchain_core.runnables import RunnableConfig
-from pydantic import BaseModel
-from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict
 
-# Load environment variables from .env file
-load_dotenv()
+import bootstrap # noqa: F401 # Loads the .env file
+from config_utils import get_config_value, get_search_params, split_source_budget
+
+# Snapshot of env overrides for Configuration fields, keyed by upper-cased field name.
+# Built lazily on first use; call _refresh_env_cache() after changing os.environ.
+_ENV_OVERRIDES: Optional[Dict[str, str]] = None
 
 DEFAULT_REPORT_STRUCTURE = """Use this structure to create a report on the user-provided topic:
 
@@ -31,6 +35,10 @@ class SearchAPI(Enum):
 class Configuration(BaseModel):
     """The configurable fields for the chatbot or report generation system."""
 
+    # Instances are memoized and shared between graph nodes, so make them immutable
+    # and never re-validate them when passed around.
+    model_config = ConfigDict(frozen=True, revalidate_instances="never", validate_assignment=False, extra="ignore")
+
     # Common configuration
     report_structure: str = DEFAULT_REPORT_STRUCTURE # Defaults to the default report structure
     
@@ -56,6 +64,42 @@ class Configuration(BaseModel):
     supervisor_model: str = "openai:gpt-4.1" # Model for supervisor agent, already OpenAI
     researcher_model: str = "openai:gpt-4.1" # Model for research agents, already OpenAI
 
+    # Resolved values used by the graph nodes, computed once per (memoized) instance
+    @cached_property
+    def effective_search_api(self) -> str:
+        """The search API name, e.g. "tavily"."""
+        return get_config_value(self.search_api)
+
+    @cached_property
+    def search_params_and_budget(self) -> tuple[Dict[str, Any], Dict[str, Any]]:
+        """search_api_config filtered by get_search_params and split once into (search params, source budget)."""
+        return split_source_budget(get_search_params(self.effective_search_api, self.search_api_config or {}))
+
+    @cached_property
+    def effective_search_params(self) -> Dict[str, Any]:
+        """search_api_config filtered down to the parameters the search API accepts."""
+        return self.search_params_and_budget[0]
+
+    @cached_property
+    def effective_source_budget(self) -> Dict[str, Any]:
+        """The per_source_char_cap / total_char_budget set in search_api_config, for format_source_docs."""
+        return self.search_params_and_budget[1]
+
+    @cached_property
+    def effective_writer_provider(self) -> str:
+        """The writer provider, also used for the researcher model."""
+        return get_config_value(self.writer_provider)
+
+    @cached_property
+    def effective_planner_kwargs(self) -> Dict[str, Any]:
+        """The planner model kwargs, never None."""
+        return get_config_value(self.planner_model_kwargs or {})
+
+    @cached_property
+    def effective_writer_kwargs(self) -> Dict[str, Any]:
+        """The writer model kwargs, never None."""
+        return get_config_value(self.writer_model_kwargs or {})
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -65,55 +109,92 @@ class Configuration(BaseModel):
         
         This method allows for dynamic configuration loading, prioritizing 
         environment variables, then values from the RunnableConfig.
+        Every graph node calls this with the same config, so instances are
+        memoized on the configurable values that map to model fields.
         """
         # Extract 'configurable' dictionary from the RunnableConfig, or use an empty dict if not present
         configurable = (
             config["configurable"] if config and "configurable" in config else {}
         )
-        
-        # Prepare values for Configuration fields
-        # It iterates through all fields defined in this Pydantic model
-        values: dict[str, Any] = {}
-        for field_name in cls.model_fields.keys():
-            # Prioritize environment variables (e.g., PLANNER_MODEL from .env)
-            # Fallback to value from RunnableConfig's 'configurable' dictionary
-            # Fallback to Pydantic field's default value if not found in either
-            env_value = os.environ.get(field_name.upper())
-            config_value = configurable.get(field_name)
-            
-            if env_value is not None:
-                values[field_name] = env_value
-            elif config_value is not None:
-                values[field_name] = config_value
-            # If neither env_var nor config_value is found, Pydantic will use the default
-            # or raise an error if the field is required and has no default.
-            # We only add to 'values' if we found something, to allow Pydantic defaults to apply.
-
-        # Create and return a Configuration instance
-        # Only pass keys that were explicitly found in environment or config,
-        # or that have defaults defined in the model.
-        # Pydantic handles parsing and type conversion.
-        # The original code's **{k: v for k, v in values.items() if v is not None}
-        # was slightly problematic if a config explicitly set a value to None
-        # when the default was something else.
-        # A better approach is to let Pydantic handle defaults by not passing the key if no override exists.
-        
-        # Corrected logic for value prioritization:
+
+        # Only the keys that map to our fields matter; LangGraph also stores its own
+        # per-task internals in 'configurable', which would defeat the cache.
+        overrides = {k: configurable[k] for k in cls.model_fields if k in configurable}
+        try:
+            return _build_config(cls, tuple(sorted(overrides.items())))
+        except TypeError:
+            # Unhashable values (e.g. dict model kwargs) can't key the cache
+            return cls._from_configurable(overrides)
+
+    @classmethod
+    def _from_configurable(cls, configurable: Dict[str, Any]) -> "Configuration":
+        """Build an instance from env variables and a 'configurable' dictionary."""
+        # Single pass over the precomputed (field, ENV_NAME) pairs:
+        # 1. Environment variables (e.g., PLANNER_MODEL from .env) take priority
+        # 2. Then the RunnableConfig's 'configurable' dictionary, even if the value is None
+        # 3. Otherwise the key is left out so Pydantic applies the field's default
+        env_get = _get_env_overrides().get
         final_values_for_instantiation: dict[str, Any] = {}
-        for field_name in cls.model_fields.keys():
-            # Check environment variable first
-            env_var_value = os.environ.get(field_name.upper())
+        for field_name, env_name in _FIELD_UPPER:
+            env_var_value = env_get(env_name)
             if env_var_value is not None:
                 final_values_for_instantiation[field_name] = env_var_value
-                continue # Found in env, use this
-
-            # Check RunnableConfig next
-            if field_name in configurable: # Check if key exists, even if value is None
+            elif field_name in configurable:
                 final_values_for_instantiation[field_name] = configurable[field_name]
-                continue # Found in config, use this
-            
-            # If not in env or config, Pydantic will use the field's default value
-            # when the instance is created. So, no need to add it to final_values_for_instantiation here.
 
+        # Values from the RunnableConfig are usually already typed (often a model_dump()
+        # of another Configuration), and defaults are validated literals, so skip
+        # Pydantic validation when every override already has its declared type.
+        # Env vars are always strings and still go through validation so that e.g.
+        # NUMBER_OF_QUERIES is coerced to int and SEARCH_API to the SearchAPI enum.
+        if all(
+            _matches_annotation(value, cls.model_fields[field_name].annotation)
+            for field_name, value in final_values_for_instantiation.items()
+        ):
+            return cls.model_construct(**final_values_for_instantiation)
         return cls(**final_values_for_instantiation)
 
+
+# (field name, environment variable name) pairs, computed once for the hot loop above
+_FIELD_UPPER = tuple((f, f.upper()) for f in Configuration.model_fields)
+
+
+def _matches_annotation(value: Any, annotation: Any) -> bool:
+    """Check a value against a simple field annotation (str/int/Enum/dict, optionally Optional)."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        return any(_matches_annotation(value, arg) for arg in get_args(annotation))
+    if annotation is type(None):
+        return value is None
+    if origin is not None:
+        annotation = origin # e.g. Dict[str, Any] -> dict
+    if not isinstance(annotation, type):
+        return False
+    if annotation is int and isinstance(value, bool):
+        return False
+    return isinstance(value, annotation)
+
+
+@lru_cache(maxsize=32)
+def _build_config(cls: type, frozen_configurable: tuple) -> Configuration:
+    """Cached wrapper around Configuration._from_configurable keyed on sorted configurable items."""
+    return cls._from_configurable(dict(frozen_configurable))
+
+
+def _get_env_overrides() -> Dict[str, str]:
+    """Return the cached env overrides, reading os.environ on first use."""
+    global _ENV_OVERRIDES
+    if _ENV_OVERRIDES is None:
+        _ENV_OVERRIDES = {
+            env_name: os.environ[env_name]
+            for _, env_name in _FIELD_UPPER
+            if env_name in os.environ
+        }
+    return _ENV_OVERRIDES
+
+
+def _refresh_env_cache() -> None:
+    """Drop the env snapshot and any Configuration built from it."""
+    global _ENV_OVERRIDES
+    _ENV_OVERRIDES = None
+    _build_config.cache_clear()
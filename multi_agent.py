@@ -1,4 +1,9 @@
-from typing import Literal, Dict, List, Union 
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from functools import cache, lru_cache, partial
+from typing import Any, Literal, Dict, List, Optional, Union 
 
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -8,11 +13,6 @@ from langgraph.constants import Send # type: ignore
 from langgraph.graph import START, END, StateGraph
 from langgraph.types import interrupt, Command # type: ignore # interrupt will be bypassed
 
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
 from state import (
     ReportStateInput,
     ReportStateOutput,
@@ -23,27 +23,213 @@ from state import (
     Section, 
     Queries,
     SearchQuery, 
+    SectionsQueries,
+    SourceDoc,
+    SearchAnswer,
     Feedback
 )
 
 from prompts import (
-    report_planner_query_writer_instructions,
     report_planner_instructions,
     query_writer_instructions, 
+    batch_query_writer_instructions,
     section_writer_instructions,
     final_section_writer_instructions,
-    section_grader_instructions,
-    section_writer_inputs
+    section_grader_prefix,
+    section_grader_suffix,
+    format_section_grader_instructions,
+    format_query_writer,
+    format_section_writer_inputs
 )
 
 from configuration import Configuration
+from config_utils import get_config_value
 from  tools1 import (
     format_sections, 
-    get_config_value, 
-    get_search_params, 
-    select_and_execute_search
+    format_source_docs,
+    search_source_docs
 )
 
+# The planner prompt is formatted around the search context, so split it once
+# and fill the static halves while the planning search is in flight.
+_PLANNER_PROMPT_HEAD, _PLANNER_PROMPT_TAIL = report_planner_instructions.split("{context}")
+
+# Upper bound on the section content sent to the grader, in tokens (approximated as 4 chars each).
+# The grader only sees the section itself, never the source material.
+MAX_GRADER_TOKENS = 2000
+
+# --- LLM Construction ---
+
+def _kwargs_key(model_kwargs: Optional[Dict[str, Any]]) -> tuple:
+    """
+    Turn model kwargs into a cache key for _get_llm.
+    Values are kept as-is, so the key is only hashable if all of them are.
+    """
+    return tuple(sorted((model_kwargs or {}).items()))
+
+def _get_llm(model: str, provider: str, kwargs_items: tuple, structured_output_cls: Optional[type] = None, thinking_max_tokens: Optional[int] = None):
+    """
+    Build a chat model (optionally wrapped with structured output) once per argument set.
+    kwargs_items are the sorted model_kwargs items, see _kwargs_key.
+    thinking_max_tokens enables extended thinking with that token limit instead of model_kwargs.
+    """
+    try:
+        hash(kwargs_items)
+    except TypeError:
+        # Unhashable values (e.g. a "stop" list or a nested response_format dict) can't key the cache
+        return _build_llm(model, provider, kwargs_items, structured_output_cls, thinking_max_tokens)
+    return _cached_llm(model, provider, kwargs_items, structured_output_cls, thinking_max_tokens)
+
+@lru_cache(maxsize=16)
+def _cached_llm(model: str, provider: str, kwargs_items: tuple, structured_output_cls: Optional[type], thinking_max_tokens: Optional[int]):
+    """Cached wrapper around _build_llm keyed on hashable arguments."""
+    return _build_llm(model, provider, kwargs_items, structured_output_cls, thinking_max_tokens)
+
+def _build_llm(model: str, provider: str, kwargs_items: tuple, structured_output_cls: Optional[type], thinking_max_tokens: Optional[int]):
+    """Build a chat model, optionally wrapped with structured output. See _get_llm."""
+    if thinking_max_tokens is not None:
+        llm = init_chat_model(
+            model=model, 
+            model_provider=provider, 
+            max_tokens=thinking_max_tokens, 
+            thinking={"type": "enabled", "budget_tokens": 16_000} # type: ignore
+        )
+    else:
+        llm = init_chat_model(
+            model=model, 
+            model_provider=provider, 
+            model_kwargs=dict(kwargs_items)
+        )
+    if structured_output_cls is not None:
+        return llm.with_structured_output(structured_output_cls)
+    return llm
+
+def warm_llms(configurable: Configuration) -> None:
+    """
+    Pre-build the structured-output models for the configuration the graph will run with,
+    so the first node calls find their schemas and tool specs already built in _get_llm's cache.
+    """
+    researcher_model_name = get_config_value(configurable.researcher_model)
+    provider_for_researcher = configurable.effective_writer_provider
+    planner_model_name = get_config_value(configurable.planner_model)
+    try:
+        _get_llm(researcher_model_name, provider_for_researcher, _kwargs_key({}), Queries)
+        _get_llm(researcher_model_name, provider_for_researcher, _kwargs_key({}), SectionsQueries)
+        _get_llm(
+            researcher_model_name, 
+            provider_for_researcher, 
+            _kwargs_key({}), 
+            Feedback, 
+            thinking_max_tokens=16000 if researcher_model_name == "gpt-4o" else None
+        )
+        _get_llm(
+            planner_model_name, 
+            get_config_value(configurable.planner_provider), 
+            _kwargs_key(configurable.effective_planner_kwargs), 
+            Sections, 
+            thinking_max_tokens=20_000 if planner_model_name == "gpt-4o" else None
+        )
+    except Exception as e:
+        # Best effort: e.g. a missing API key will surface on the first real call instead
+        print(f"--- warm_llms: Skipping LLM warm-up: {e} ---")
+
+# --- Search Caching ---
+
+# Source documents per (normalized query, search API, params), shared by the
+# planner and all sections so overlapping queries only hit the search API once.
+# This is the only search cache. It lives as long as the process, so it is bounded
+# (least recently used entries are evicted first) and entries expire after an hour.
+_SEARCH_CACHE_MAX_ENTRIES = 512
+_SEARCH_CACHE_TTL_SECONDS = 3600
+_SEARCH_CACHE: "OrderedDict[tuple, tuple[float, List[Union[SourceDoc, SearchAnswer]]]]" = OrderedDict()
+
+# Searches currently running, so concurrent callers (e.g. parallel sections) wait for
+# the same query instead of searching it again. Resolves to None if the search failed.
+_SEARCH_IN_FLIGHT: Dict[tuple, asyncio.Future] = {}
+
+def _search_cache_get(key: tuple) -> Optional[List[Union[SourceDoc, SearchAnswer]]]:
+    """
+    Returns the cached source documents for key, or None if missing or expired.
+    """
+    entry = _SEARCH_CACHE.get(key)
+    if entry is None:
+        return None
+    stored_at, docs = entry
+    if time.monotonic() - stored_at > _SEARCH_CACHE_TTL_SECONDS:
+        del _SEARCH_CACHE[key]
+        return None
+    _SEARCH_CACHE.move_to_end(key)
+    return docs
+
+def _search_cache_put(key: tuple, docs: List[Union[SourceDoc, SearchAnswer]]) -> None:
+    """
+    Caches the source documents for key, evicting the least recently used entries past the size limit.
+    """
+    _SEARCH_CACHE[key] = (time.monotonic(), docs)
+    _SEARCH_CACHE.move_to_end(key)
+    while len(_SEARCH_CACHE) > _SEARCH_CACHE_MAX_ENTRIES:
+        _SEARCH_CACHE.popitem(last=False)
+
+def _normalize_query(query: str) -> str:
+    """
+    Lowercase and collapse whitespace so trivially different queries share a cache entry.
+    """
+    return " ".join(query.lower().split())
+
+async def _cached_search(search_api: str, query_list: List[str], params_to_pass: dict) -> List[Union[SourceDoc, SearchAnswer]]:
+    """
+    Search only the queries missing from _SEARCH_CACHE and return the source documents of all queries, in order.
+    Queries another caller is already searching are awaited rather than searched again.
+    """
+    params_key = json.dumps(params_to_pass, sort_keys=True, default=str)
+    queries_by_key = {}
+    for query in query_list:
+        queries_by_key.setdefault((_normalize_query(query), search_api, params_key), query)
+
+    loop = asyncio.get_running_loop()
+    docs_by_key: Dict[tuple, List[Union[SourceDoc, SearchAnswer]]] = {}
+    pending: Dict[tuple, asyncio.Future] = {}
+    misses = []
+    for key in queries_by_key:
+        docs = _search_cache_get(key)
+        if docs is not None:
+            docs_by_key[key] = docs
+        elif key in _SEARCH_IN_FLIGHT and _SEARCH_IN_FLIGHT[key].get_loop() is loop:
+            pending[key] = _SEARCH_IN_FLIGHT[key]
+        else:
+            misses.append(key)
+
+    if misses:
+        print(f"--- _cached_search: {len(docs_by_key)} cached, {len(pending)} in flight, {len(misses)} to search ---")
+        owned = {key: loop.create_future() for key in misses}
+        _SEARCH_IN_FLIGHT.update(owned)
+        try:
+            docs_by_query = await search_source_docs(search_api, [queries_by_key[key] for key in misses], params_to_pass)
+            for key, future in owned.items():
+                # Failed queries are missing from the result and are not cached, so they're retried next time
+                docs = docs_by_query.get(queries_by_key[key])
+                if docs is not None:
+                    _search_cache_put(key, docs)
+                    docs_by_key[key] = docs
+                future.set_result(docs)
+        finally:
+            for key, future in owned.items():
+                if not future.done(): # The search raised or was cancelled; waiters get no documents
+                    future.set_result(None)
+                if _SEARCH_IN_FLIGHT.get(key) is future:
+                    del _SEARCH_IN_FLIGHT[key]
+
+    for key, future in pending.items():
+        # Shielded so a cancelled caller doesn't cancel the search for everyone waiting on it
+        docs = await asyncio.shield(future)
+        if docs is not None:
+            docs_by_key[key] = docs
+
+    source_docs = []
+    for key in queries_by_key:
+        source_docs.extend(docs_by_key.get(key, []))
+    return source_docs
+
 # --- Graph Node Definitions ---
 
 async def generate_report_plan(state: ReportState, config: RunnableConfig) -> Dict[str, List[Section]]:
@@ -57,91 +243,104 @@ async def generate_report_plan(state: ReportState, config: RunnableConfig) -> Di
     configurable = Configuration.from_runnable_config(config)
     report_structure = configurable.report_structure
     number_of_queries = configurable.number_of_queries
-    search_api = get_config_value(configurable.search_api)
-    search_api_config = configurable.search_api_config or {}
-    params_to_pass = get_search_params(search_api, search_api_config)
+    search_api = configurable.effective_search_api
+    params_to_pass = configurable.effective_search_params
 
     if isinstance(report_structure, dict):
         report_structure = str(report_structure)
 
-    researcher_model_name = get_config_value(configurable.researcher_model)
-    provider_for_researcher = get_config_value(configurable.writer_provider) 
-    researcher_model_kwargs = {} 
-    
-    initial_query_writing_llm = init_chat_model(
-        model=researcher_model_name, 
-        model_provider=provider_for_researcher, 
-        model_kwargs=researcher_model_kwargs
-    ).with_structured_output(Queries)
-
-    query_writer_prompt = report_planner_query_writer_instructions.format(
-        topic=topic, 
-        report_organization=report_structure, 
-        number_of_queries=number_of_queries
-    )
-    query_generation_result = await initial_query_writing_llm.ainvoke([
-        SystemMessage(content=query_writer_prompt),
-        HumanMessage(content="Generate search queries that will help with planning the sections of the report.")
-    ])
+    # Feedback only reshapes the plan for the same topic, so reuse the research context
+    # from the previous plan instead of re-running the query writer and the search.
+    cached_research_context = state.get("cached_research_context")
+    search_task = None
+    if feedback_list and cached_research_context:
+        print("--- generate_report_plan: Reusing cached research context for feedback on the plan ---")
+    else:
+        researcher_model_name = get_config_value(configurable.researcher_model)
+        provider_for_researcher = configurable.effective_writer_provider
+        researcher_model_kwargs = {} 
     
-    query_list_str = [sq.search_query for sq in query_generation_result.queries]
-    source_str = await select_and_execute_search(search_api, query_list_str, params_to_pass)
+        initial_query_writing_llm = _get_llm(
+            researcher_model_name, provider_for_researcher, _kwargs_key(researcher_model_kwargs), Queries
+        )
 
-    planner_prompt_system = report_planner_instructions.format(
-        topic=topic, 
-        report_organization=report_structure, 
-        context=source_str, 
-        feedback=feedback
-    )
-    planner_provider = get_config_value(configurable.planner_provider)
-    planner_model_name = get_config_value(configurable.planner_model)
-    planner_model_kwargs = get_config_value(configurable.planner_model_kwargs or {})
-    
-    planner_llm_instance = init_chat_model(
-        model=planner_model_name, 
-        model_provider=planner_provider, 
-        model_kwargs=planner_model_kwargs
-    )
-    if planner_model_name == "gpt-4o":
-        planner_llm_instance = init_chat_model(
-            model=planner_model_name, 
-            model_provider=planner_provider, 
-            max_tokens=20_000, 
-            thinking={"type": "enabled", "budget_tokens": 16_000} # type: ignore
+        query_writer_prompt = format_query_writer(
+            topic=topic, 
+            report_organization=report_structure, 
+            number_of_queries=number_of_queries
         )
-    structured_planner_llm = planner_llm_instance.with_structured_output(Sections)
+        query_generation_result = await initial_query_writing_llm.ainvoke([
+            SystemMessage(content=query_writer_prompt),
+            HumanMessage(content="Generate search queries that will help with planning the sections of the report.")
+        ])
+    
+        query_list_str = [sq.search_query for sq in query_generation_result.queries]
+        # Start the search; it makes progress while the planner LLM is built in a worker thread below
+        search_task = asyncio.create_task(_cached_search(search_api, query_list_str, params_to_pass))
+
+    try:
+        planner_prompt_head = _PLANNER_PROMPT_HEAD.format(topic=topic, report_organization=report_structure)
+        planner_prompt_tail = _PLANNER_PROMPT_TAIL.format(feedback=feedback)
+        planner_provider = get_config_value(configurable.planner_provider)
+        planner_model_name = get_config_value(configurable.planner_model)
+        planner_model_kwargs = configurable.effective_planner_kwargs
+        
+        structured_planner_llm = await asyncio.get_running_loop().run_in_executor(None, partial(
+            _get_llm, 
+            planner_model_name, 
+            planner_provider, 
+            _kwargs_key(planner_model_kwargs), 
+            Sections, 
+            thinking_max_tokens=20_000 if planner_model_name == "gpt-4o" else None
+        ))
+    except BaseException:
+        # Don't leave the search running unawaited if the planner can't be prepared
+        if search_task is not None:
+            search_task.cancel()
+        raise
     
     planner_message_user = """Generate the sections of the report. Your response must include a 'sections' field containing a list of sections. 
 Each section must have: name, description, research, and content fields."""
 
+    source_str = (
+        cached_research_context if search_task is None
+        else format_source_docs(await search_task, **configurable.effective_source_budget)
+    )
+    planner_prompt_system = planner_prompt_head + source_str + planner_prompt_tail
+
     report_sections_result = await structured_planner_llm.ainvoke([
         SystemMessage(content=planner_prompt_system),
         HumanMessage(content=planner_message_user)
     ])
 
-    return {"sections": report_sections_result.sections}
+    sections = report_sections_result.sections
+    research_sections = []
+    non_research_sections = []
+    for s in sections:
+        (research_sections if s.research else non_research_sections).append(s)
+    return {
+        "cached_research_context": source_str,
+        "sections": sections,
+        "research_sections": research_sections,
+        "non_research_sections": non_research_sections,
+        "section_grader_prefix": section_grader_prefix.format(topic=topic),
+        "section_grader_suffix": section_grader_suffix.format(number_of_follow_up_queries=number_of_queries),
+    }
 
 
-def human_feedback_node(state: ReportState, config: RunnableConfig) -> Command[Literal["generate_report_plan", "build_section_with_web_research", "gather_completed_sections"]]: # type: ignore
+def human_feedback_node(state: ReportState, config: RunnableConfig) -> Command[Literal["generate_report_plan", "generate_all_queries", "gather_completed_sections"]]: # type: ignore
     """
     Bypasses human feedback and automatically approves the report plan for diagnostic purposes.
     """
     print("--- human_feedback_node: Auto-approving plan for diagnostics ---")
-    topic = state["topic"]
-    sections = state['sections']
-    
+
     # Simulate automatic approval
     feedback_input = True 
 
     if isinstance(feedback_input, bool) and feedback_input is True:
-        research_tasks = [
-            Send("build_section_with_web_research", {"topic": topic, "section": s, "search_iterations": 0}) 
-            for s in sections 
-            if s.research
-        ]
-        if research_tasks:
-            print(f"--- human_feedback_node: Sending {len(research_tasks)} sections to 'build_section_with_web_research' ---")
-            return Command(goto=research_tasks)
+        if state["research_sections"]:
+            print("--- human_feedback_node: Research sections found. Proceeding to 'generate_all_queries' ---")
+            return Command(goto="generate_all_queries")
         else:
             print("--- human_feedback_node: No research sections. Proceeding to 'gather_completed_sections' ---")
             return Command(goto="gather_completed_sections")
@@ -157,9 +356,56 @@ def human_feedback_node(state: ReportState, config: RunnableConfig) -> Command[L
             "This node is set to auto-approve."
         )
 
+async def generate_all_queries_node(state: ReportState, config: RunnableConfig) -> Command[Literal["build_section_with_web_research"]]: # type: ignore
+    """
+    Generate search queries for all research sections in one call (uses researcher_model)
+    and send each section to 'build_section_with_web_research' with its queries.
+    """
+    topic = state["topic"]
+    research_sections = state["research_sections"]
+
+    configurable = Configuration.from_runnable_config(config)
+    number_of_queries = configurable.number_of_queries
+
+    researcher_model_name = get_config_value(configurable.researcher_model)
+    provider_for_researcher = configurable.effective_writer_provider
+    researcher_model_kwargs = {} 
+    
+    query_writing_llm = _get_llm(
+        researcher_model_name, provider_for_researcher, _kwargs_key(researcher_model_kwargs), SectionsQueries
+    )
+
+    system_instructions = batch_query_writer_instructions.format(
+        topic=topic, 
+        sections="\n".join(f"- {s.name}: {s.description}" for s in research_sections), 
+        number_of_queries=number_of_queries
+    )
+    queries_result = await query_writing_llm.ainvoke([
+        SystemMessage(content=system_instructions),
+        HumanMessage(content="Generate search queries for each of the provided sections.")
+    ])
+    queries_by_section = {sq.section_name: sq.queries for sq in queries_result.section_queries}
+
+    research_tasks = []
+    for s in research_sections:
+        section_input = {
+            "topic": topic, 
+            "section": s, 
+            "search_iterations": 0,
+            "section_grader_prefix": state["section_grader_prefix"],
+            "section_grader_suffix": state["section_grader_suffix"],
+        }
+        # Sections the model skipped fall back to the subgraph's own 'generate_queries' step
+        if queries_by_section.get(s.name):
+            section_input["search_queries"] = queries_by_section[s.name]
+        research_tasks.append(Send("build_section_with_web_research", section_input))
+    print(f"--- generate_all_queries_node: Sending {len(research_tasks)} sections to 'build_section_with_web_research' ---")
+    return Command(goto=research_tasks)
+
 async def generate_queries_node(state: SectionState, config: RunnableConfig) -> Dict[str, List[SearchQuery]]:
     """
     Generate search queries for researching a specific section (uses researcher_model).
+    Only used for sections that 'generate_all_queries' did not return queries for.
     """
     topic = state["topic"]
     section = state["section"]
@@ -168,14 +414,12 @@ async def generate_queries_node(state: SectionState, config: RunnableConfig) ->
     number_of_queries = configurable.number_of_queries
 
     researcher_model_name = get_config_value(configurable.researcher_model)
-    provider_for_researcher = get_config_value(configurable.writer_provider) 
+    provider_for_researcher = configurable.effective_writer_provider
     researcher_model_kwargs = {} 
     
-    query_writing_llm = init_chat_model(
-        model=researcher_model_name, 
-        model_provider=provider_for_researcher, 
-        model_kwargs=researcher_model_kwargs
-    ).with_structured_output(Queries)
+    query_writing_llm = _get_llm(
+        researcher_model_name, provider_for_researcher, _kwargs_key(researcher_model_kwargs), Queries
+    )
 
     system_instructions = query_writer_instructions.format(
         topic=topic, 
@@ -194,14 +438,14 @@ async def search_web_node(state: SectionState, config: RunnableConfig) -> Dict[s
     """
     search_queries = state["search_queries"]
     configurable = Configuration.from_runnable_config(config)
-    search_api = get_config_value(configurable.search_api)
-    search_api_config = configurable.search_api_config or {}
-    params_to_pass = get_search_params(search_api, search_api_config)
+    search_api = configurable.effective_search_api
+    params_to_pass = configurable.effective_search_params
 
     query_list_str = [query.search_query for query in search_queries]
     print(f"--- search_web_node: Executing search for section '{state['section'].name}', API: {search_api}, Queries: {query_list_str}, Params: {params_to_pass} ---")
-    source_str = await select_and_execute_search(search_api, query_list_str, params_to_pass)
-    return {"source_str": source_str, "search_iterations": state["search_iterations"] + 1}
+    source_docs = await _cached_search(search_api, query_list_str, params_to_pass)
+    # Appended to the sources of earlier iterations by the 'source_sources' reducer
+    return {"source_sources": source_docs, "search_iterations": state["search_iterations"] + 1}
 
 async def write_section_node(state: SectionState, config: RunnableConfig) -> Command[Literal[END, "search_web"]]: # type: ignore
     """
@@ -209,30 +453,51 @@ async def write_section_node(state: SectionState, config: RunnableConfig) -> Com
     """
     topic = state["topic"]
     section = state["section"] 
-    source_str = state["source_str"]
+    search_iterations = state["search_iterations"]
     configurable = Configuration.from_runnable_config(config)
+    # Format the accumulated sources into text once for this call, within the configured budget
+    source_str = format_source_docs(state["source_sources"], **configurable.effective_source_budget)
+    # Read each setting once; the researcher (grader) model shares the writer provider
+    writer_provider = configurable.effective_writer_provider
+    writer_model_name = get_config_value(configurable.writer_model)
+    writer_model_kwargs = configurable.effective_writer_kwargs
+    researcher_model_name = get_config_value(configurable.researcher_model)
+    max_search_depth = configurable.max_search_depth
     print(f"--- write_section_node: Writing section '{section.name}' ---")
 
-    section_writer_inputs_formatted = section_writer_inputs.format(
+    section_writer_inputs_formatted = format_section_writer_inputs(
         topic=topic, 
         section_name=section.name, 
         section_topic=section.description, 
         context=source_str, 
         section_content=section.content
     )
-    writer_provider = get_config_value(configurable.writer_provider)
-    writer_model_name = get_config_value(configurable.writer_model)
-    writer_model_kwargs = get_config_value(configurable.writer_model_kwargs or {})
-    section_writing_llm = init_chat_model(
-        model=writer_model_name, 
-        model_provider=writer_provider, 
-        model_kwargs=writer_model_kwargs
-    )
-    section_content_result = await section_writing_llm.ainvoke([
-        SystemMessage(content=section_writer_instructions),
-        HumanMessage(content=section_writer_inputs_formatted)
-    ])
-    section.content = section_content_result.content
+    section_writing_llm = _get_llm(writer_model_name, writer_provider, _kwargs_key(writer_model_kwargs))
+    researcher_model_kwargs = {}
+
+    # The grader model doesn't depend on the written section, so build it (a cache hit
+    # after the first call) in a worker thread while the writer call is in flight
+    reflection_llm_future = asyncio.get_running_loop().run_in_executor(None, partial(
+        _get_llm, 
+        researcher_model_name, 
+        writer_provider, 
+        _kwargs_key(researcher_model_kwargs), 
+        Feedback, 
+        thinking_max_tokens=16000 if researcher_model_name == "gpt-4o" else None
+    ))
+
+    try:
+        section_content_result = await section_writing_llm.ainvoke([
+            SystemMessage(content=section_writer_instructions),
+            HumanMessage(content=section_writer_inputs_formatted)
+        ])
+    except BaseException:
+        # Don't leave the grader build orphaned (and its error unretrieved) if the writer fails
+        reflection_llm_future.cancel()
+        raise
+    # Copy instead of mutating: the planned Section is shared with the parent state and other tasks.
+    # model_copy skips re-validation since the other fields are already validated.
+    section = section.model_copy(update={"content": section_content_result.content})
     print(f"--- write_section_node: Section '{section.name}' content generated. Now grading. ---")
 
     section_grader_message_user = (
@@ -240,38 +505,21 @@ async def write_section_node(state: SectionState, config: RunnableConfig) -> Com
         "If the grade is 'pass', return empty strings for all follow-up queries. "
         "If the grade is 'fail', provide specific search queries to gather missing information."
     )
-    section_grader_instructions_formatted = section_grader_instructions.format(
-        topic=topic, 
-        section_topic=section.description,
-        section=section.content, 
-        number_of_follow_up_queries=configurable.number_of_queries
-    )
-    
-    researcher_model_name_for_grade = get_config_value(configurable.researcher_model)
-    provider_for_researcher_grade = get_config_value(configurable.writer_provider)
-    researcher_model_kwargs_for_grade = {}
-
-    reflection_llm_instance = init_chat_model(
-        model=researcher_model_name_for_grade, 
-        model_provider=provider_for_researcher_grade, 
-        model_kwargs=researcher_model_kwargs_for_grade
+    section_grader_instructions_formatted = format_section_grader_instructions(
+        state["section_grader_prefix"], 
+        section.description, 
+        section.content[:MAX_GRADER_TOKENS * 4], 
+        state["section_grader_suffix"]
     )
-    if researcher_model_name_for_grade == "gpt-4o":
-         reflection_llm_instance = init_chat_model(
-            model=researcher_model_name_for_grade, 
-            model_provider=provider_for_researcher_grade, 
-            max_tokens=16000, 
-            thinking={"type": "enabled", "budget_tokens": 16_000} # type: ignore
-        )
-    structured_reflection_llm = reflection_llm_instance.with_structured_output(Feedback)
 
+    structured_reflection_llm = await reflection_llm_future
     feedback_result = await structured_reflection_llm.ainvoke([
         SystemMessage(content=section_grader_instructions_formatted),
         HumanMessage(content=section_grader_message_user)
     ])
-    print(f"--- write_section_node: Section '{section.name}' graded. Grade: {feedback_result.grade}, Iteration: {state['search_iterations']} ---")
+    print(f"--- write_section_node: Section '{section.name}' graded. Grade: {feedback_result.grade}, Iteration: {search_iterations} ---")
 
-    if feedback_result.grade == "pass" or state["search_iterations"] >= configurable.max_search_depth:
+    if feedback_result.grade == "pass" or search_iterations >= max_search_depth:
         print(f"--- write_section_node: Section '{section.name}' PASSED or max depth reached. Ending sub-graph. ---")
         return Command(update={"completed_sections": [section]}, goto=END)
     else:
@@ -294,21 +542,25 @@ async def write_final_sections_node(state: SectionState, config: RunnableConfig)
         section_topic=section.description, 
         context=completed_report_sections_context
     )
-    writer_provider = get_config_value(configurable.writer_provider)
+    writer_provider = configurable.effective_writer_provider
     writer_model_name = get_config_value(configurable.writer_model)
-    writer_model_kwargs = get_config_value(configurable.writer_model_kwargs or {})
-    final_section_writer_llm = init_chat_model(
-        model=writer_model_name, 
-        model_provider=writer_provider, 
-        model_kwargs=writer_model_kwargs
-    )
+    writer_model_kwargs = configurable.effective_writer_kwargs
+    final_section_writer_llm = _get_llm(writer_model_name, writer_provider, _kwargs_key(writer_model_kwargs))
     section_content_result = await final_section_writer_llm.ainvoke([
         SystemMessage(content=system_instructions),
         HumanMessage(content="Generate a report section based on the provided topic, description, and context from other sections.")
     ])
-    section.content = section_content_result.content
+    # Copy instead of mutating: the planned Section is shared with the parent state and other tasks.
+    # model_copy skips re-validation since the other fields are already validated.
+    section = section.model_copy(update={"content": section_content_result.content})
     return {"completed_sections": [section]}
 
+def route_section_start(state: SectionState) -> Literal["generate_queries", "search_web"]:
+    """
+    Skip query generation when the section arrives with queries already generated.
+    """
+    return "search_web" if state.get("search_queries") else "generate_queries"
+
 def gather_completed_sections_node(state: ReportState) -> Dict[str, str]:
     """
     Formats completed sections into a single string for context.
@@ -325,14 +577,24 @@ def compile_final_report_node(state: ReportState) -> Dict[str, str]:
     planned_sections = state["sections"] 
     completed_content_map = {s.name: s.content for s in state.get("completed_sections", [])}
     print(f"--- compile_final_report_node: Compiling final report from {len(planned_sections)} planned sections. ---")
-    final_report_parts = []
+    # Build the report from small chunks joined once, rather than per-section f-strings joined again
+    buf = []
+    append = buf.append
     for planned_section in planned_sections:
-        content = completed_content_map.get(planned_section.name, f"[Content for section '{planned_section.name}' not found/completed]")
-        content_str = str(content) if content is not None else f"[Content for section '{planned_section.name}' is None]"
-        final_report_parts.append(f"## {planned_section.name}\n\n{content_str}")
+        name = planned_section.name
+        if buf:
+            append("\n\n")
+        append("## ")
+        append(name)
+        append("\n\n")
+        if name not in completed_content_map:
+            append(f"[Content for section '{name}' not found/completed]")
+        elif completed_content_map[name] is None:
+            append(f"[Content for section '{name}' is None]")
+        else:
+            append(str(completed_content_map[name]))
 
-    full_report = "\n\n".join(final_report_parts)
-    return {"final_report": full_report}
+    return {"final_report": "".join(buf)}
 
 def initiate_final_section_writing_edge(state: ReportState) -> List[Send]:
     """
@@ -347,60 +609,72 @@ def initiate_final_section_writing_edge(state: ReportState) -> List[Send]:
                 "report_sections_from_research": state["report_sections_from_research"]
             }
         ) 
-        for s in state["sections"] 
-        if not s.research
+        for s in state["non_research_sections"]
     ]
     if tasks:
         print(f"--- initiate_final_section_writing_edge: Sending {len(tasks)} non-research sections to 'write_final_sections'. ---")
     return tasks
 
-# --- Graph Construction ---
-
-section_builder_graph = StateGraph(SectionState, output=SectionOutputState) # type: ignore
-section_builder_graph.add_node("generate_queries", generate_queries_node)
-section_builder_graph.add_node("search_web", search_web_node)
-section_builder_graph.add_node("write_section", write_section_node)
-section_builder_graph.add_edge(START, "generate_queries")
-section_builder_graph.add_edge("generate_queries", "search_web")
-section_builder_graph.add_edge("search_web", "write_section")
-
-report_builder_graph = StateGraph(ReportState, input=ReportStateInput, output=ReportStateOutput, config_schema=Configuration) # type: ignore
-report_builder_graph.add_node("generate_report_plan", generate_report_plan)
-report_builder_graph.add_node("human_feedback", human_feedback_node) # Now auto-approves
-report_builder_graph.add_node("build_section_with_web_research", section_builder_graph.compile())
-report_builder_graph.add_node("gather_completed_sections", gather_completed_sections_node)
-report_builder_graph.add_node("write_final_sections", write_final_sections_node) 
-report_builder_graph.add_node("compile_final_report", compile_final_report_node)
-
-report_builder_graph.add_edge(START, "generate_report_plan")
-report_builder_graph.add_edge("generate_report_plan", "human_feedback")
-report_builder_graph.add_edge("build_section_with_web_research", "gather_completed_sections")
-
 def router_after_gather_sections(state: ReportState) -> Union[List[Send], str]:
     """
     Router function to decide if non-research sections need to be written.
     If so, returns Send commands generated by initiate_final_section_writing_edge.
     Otherwise, returns the name of the next node ("compile_final_report").
     """
-    if any(not s.research for s in state["sections"]):
+    if state["non_research_sections"]:
         print("--- router_after_gather_sections: Non-research sections found. Initiating tasks. ---")
         return initiate_final_section_writing_edge(state) 
     else:
         print("--- router_after_gather_sections: No non-research sections. Proceeding to compile report. ---")
         return "compile_final_report"
 
-report_builder_graph.add_conditional_edges(
-    "gather_completed_sections",
-    router_after_gather_sections,
-    {
-        "compile_final_report": "compile_final_report"
-        # If router_after_gather_sections returns List[Send], LangGraph handles dispatching.
-        # The next node after those Sends complete will be determined by the edge from 'write_final_sections'.
-    }
-)
+# --- Graph Construction ---
 
-report_builder_graph.add_edge("write_final_sections", "compile_final_report")
-report_builder_graph.add_edge("compile_final_report", END)
+@cache
+def get_graph():
+    """
+    Build and compile the report graph on first use, so importing this module stays cheap.
+    """
+    section_builder_graph = StateGraph(SectionState, output=SectionOutputState) # type: ignore
+    section_builder_graph.add_node("generate_queries", generate_queries_node)
+    section_builder_graph.add_node("search_web", search_web_node)
+    section_builder_graph.add_node("write_section", write_section_node)
+    section_builder_graph.add_conditional_edges(START, route_section_start, ["generate_queries", "search_web"])
+    section_builder_graph.add_edge("generate_queries", "search_web")
+    section_builder_graph.add_edge("search_web", "write_section")
+
+    report_builder_graph = StateGraph(ReportState, input=ReportStateInput, output=ReportStateOutput, config_schema=Configuration) # type: ignore
+    report_builder_graph.add_node("generate_report_plan", generate_report_plan)
+    report_builder_graph.add_node("human_feedback", human_feedback_node) # Now auto-approves
+    report_builder_graph.add_node("generate_all_queries", generate_all_queries_node)
+    report_builder_graph.add_node("build_section_with_web_research", section_builder_graph.compile())
+    report_builder_graph.add_node("gather_completed_sections", gather_completed_sections_node)
+    report_builder_graph.add_node("write_final_sections", write_final_sections_node) 
+    report_builder_graph.add_node("compile_final_report", compile_final_report_node)
+
+    report_builder_graph.add_edge(START, "generate_report_plan")
+    report_builder_graph.add_edge("generate_report_plan", "human_feedback")
+    report_builder_graph.add_edge("build_section_with_web_research", "gather_completed_sections")
+
+    report_builder_graph.add_conditional_edges(
+        "gather_completed_sections",
+        router_after_gather_sections,
+        {
+            "compile_final_report": "compile_final_report"
+            # If router_after_gather_sections returns List[Send], LangGraph handles dispatching.
+            # The next node after those Sends complete will be determined by the edge from 'write_final_sections'.
+        }
+    )
 
-graph = report_builder_graph.compile()
+    report_builder_graph.add_edge("write_final_sections", "compile_final_report")
+    report_builder_graph.add_edge("compile_final_report", END)
 
+    return report_builder_graph.compile()
+
+def __getattr__(name: str):
+    """
+    Lazily expose the compiled graph as the module attribute 'graph'.
+    """
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,3 +1,5 @@
+from string import Formatter
+
 report_planner_query_writer_instructions="""You are performing research for a report. 
 
 <Report topic>
@@ -104,6 +106,33 @@ Call the Queries tool
 </Format>
 """
 
+batch_query_writer_instructions="""You are an expert technical writer crafting targeted web search queries that will gather comprehensive information for writing several sections of a technical report.
+
+<Report topic>
+{topic}
+</Report topic>
+
+<Sections>
+{sections}
+</Sections>
+
+<Task>
+For EACH section listed above, generate {number_of_queries} search queries that will help gather comprehensive information about that section's topic. 
+
+The queries should:
+
+1. Be related to the topic 
+2. Examine different aspects of the section topic
+
+Make the queries specific enough to find high-quality, relevant sources.
+Use the section name exactly as given above for each section's queries.
+</Task>
+
+<Format>
+Call the SectionsQueries tool 
+</Format>
+"""
+
 section_writer_instructions = """Write one section of a research report.
 
 <Task>
@@ -393,3 +422,53 @@ Before each search query or when writing the section, think through:
 - Always follow markdown formatting
 - Stay within the 200 word limit for the main content
 """
+
+
+## Template formatting
+# The hot templates are split into (literal, field) chunks once at import so
+# each call only concatenates, instead of re-parsing the template with str.format.
+
+def _compile_template(template: str) -> tuple:
+    """Split a str.format template into (literal_text, field_name) chunks."""
+    return tuple((literal, field_name) for literal, field_name, _, _ in Formatter().parse(template))
+
+def _render(chunks: tuple, values: dict) -> str:
+    """Fill compiled template chunks with values."""
+    parts = []
+    for literal, field_name in chunks:
+        parts.append(literal)
+        if field_name is not None:
+            parts.append(str(values[field_name]))
+    return "".join(parts)
+
+_QUERY_WRITER_CHUNKS = _compile_template(report_planner_query_writer_instructions)
+_SECTION_WRITER_INPUTS_CHUNKS = _compile_template(section_writer_inputs)
+
+def format_query_writer(topic: str, report_organization: str, number_of_queries: int) -> str:
+    """Equivalent to report_planner_query_writer_instructions.format(...)."""
+    return _render(_QUERY_WRITER_CHUNKS, {
+        "topic": topic,
+        "report_organization": report_organization,
+        "number_of_queries": number_of_queries,
+    })
+
+def format_section_writer_inputs(topic: str, section_name: str, section_topic: str, context: str, section_content: str) -> str:
+    """Equivalent to section_writer_inputs.format(...)."""
+    return _render(_SECTION_WRITER_INPUTS_CHUNKS, {
+        "topic": topic,
+        "section_name": section_name,
+        "section_topic": section_topic,
+        "context": context,
+        "section_content": section_content,
+    })
+
+# The grader's topic and follow-up query count are fixed for a whole report, so its
+# template is split around the per-section fields: the prefix and suffix are formatted
+# once per report and each grading call only concatenates the section topic and content.
+# Everything comes from the template itself, so editing it can't leave a stale copy here.
+section_grader_prefix, _section_grader_rest = section_grader_instructions.split("{section_topic}", 1)
+_section_grader_middle, section_grader_suffix = _section_grader_rest.split("{section}", 1)
+
+def format_section_grader_instructions(prefix: str, section_topic: str, section: str, suffix: str) -> str:
+    """Equivalent to section_grader_instructions.format(...) given the formatted prefix and suffix."""
+    return prefix + section_topic + _section_grader_middle + section + suffix
@@ -1,4 +1,4 @@
-from typing import Annotated, List, TypedDict, Literal
+from typing import Annotated, List, Optional, TypedDict, Literal, Union
 from pydantic import BaseModel, Field
 import operator
 
@@ -29,6 +29,47 @@ class Queries(BaseModel):
         description="List of search queries.",
     )
 
+class SectionQueries(BaseModel):
+    section_name: str = Field(
+        description="Name of the report section these queries are for.",
+    )
+    queries: List[SearchQuery] = Field(
+        description="List of search queries for this section.",
+    )
+
+class SectionsQueries(BaseModel):
+    section_queries: List[SectionQueries] = Field(
+        description="Search queries for each report section.",
+    )
+
+class SourceDoc(BaseModel):
+    query: str = Field(
+        description="Search query that returned this source.",
+    )
+    url: str = Field(
+        description="URL of the source.",
+    )
+    title: str = Field(
+        description="Title of the source.",
+    )
+    content: str = Field(
+        description="Summary of the source returned by the search API.",
+    )
+    raw_content: Optional[str] = Field(
+        None, description="Full content of the source, if returned by the search API."
+    )
+    score: float = Field(
+        description="Relevance score returned by the search API.",
+    )
+
+class SearchAnswer(BaseModel):
+    query: str = Field(
+        description="Search query the answer is for.",
+    )
+    answer: str = Field(
+        description="Direct answer returned by the search API (when include_answer is set).",
+    )
+
 class Feedback(BaseModel):
     grade: Literal["pass","fail"] = Field(
         description="Evaluation result indicating whether the response meets requirements ('pass') or needs revision ('fail')."
@@ -46,7 +87,12 @@ class ReportStateOutput(TypedDict):
 class ReportState(TypedDict):
     topic: str # Report topic    
     feedback_on_report_plan: Annotated[list[str], operator.add] # List of feedback on the report plan
+    cached_research_context: Optional[str] # Formatted planning search results, reused when regenerating the plan from feedback
     sections: list[Section] # List of report sections 
+    research_sections: list[Section] # Sections that require web research, split once after planning
+    non_research_sections: list[Section] # Sections written from the completed research sections
+    section_grader_prefix: str # Grader instructions before the section, formatted once per report
+    section_grader_suffix: str # Grader instructions after the section, formatted once per report
     completed_sections: Annotated[list, operator.add] # Send() API key
     report_sections_from_research: str # String of any completed sections from research to write final sections
     final_report: str # Final report
@@ -56,7 +102,9 @@ class SectionState(TypedDict):
     section: Section # Report section  
     search_iterations: int # Number of search iterations done
     search_queries: list[SearchQuery] # List of search queries
-    source_str: str # String of formatted source content from web search
+    section_grader_prefix: str # Grader instructions before the section, formatted once per report
+    section_grader_suffix: str # Grader instructions after the section, formatted once per report
+    source_sources: Annotated[list[Union[SourceDoc, SearchAnswer]], operator.add] # Sources (and direct answers) from all web search iterations, appended per search
     report_sections_from_research: str # String of any completed sections from research to write final sections
     completed_sections: list[Section] # Final key we duplicate in outer state for Send() API
 
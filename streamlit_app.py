@@ -1,63 +1,167 @@
 import streamlit as st
 import asyncio
 import os
+import queue
+import threading
+from typing import TYPE_CHECKING
 
-# Make sure other project files are accessible
-# e.g., by being in the same directory or in PYTHONPATH
-from multi_agent import graph as multi_agent_graph # Using the graph from multi_agent_py_v3
-from configuration import Configuration
-from state import ReportStateInput # To define the input schema for the graph
-from langchain_core.runnables import RunnableConfig
+if TYPE_CHECKING: # Only for type hints; the real imports happen lazily in get_graph_and_cfg
+    from langchain_core.runnables import RunnableConfig
+    from state import ReportStateInput
+
+# Graph channels the UI actually reads: live sections and the final report
+STREAM_OUTPUT_KEYS = ["completed_sections", "final_report"]
+
+@st.cache_resource
+def get_graph_and_cfg():
+    """
+    Imports the agent modules on first use rather than at the top of the script.
+    They pull in LangGraph, LangChain, the OpenAI and Tavily clients and the pydantic models,
+    so the UI renders before paying that cost, and only the first generate click pays it.
+    """
+    # Make sure other project files are accessible
+    # e.g., by being in the same directory or in PYTHONPATH
+    from configuration import Configuration
+    from state import ReportStateInput # To define the input schema for the graph
+    from langchain_core.runnables import RunnableConfig
+    return get_compiled_graph(), Configuration, ReportStateInput, RunnableConfig
+
+@st.cache_resource
+def get_compiled_graph():
+    """
+    Compiles the multi-agent graph once per process and shares it across reruns and sessions,
+    and warms its LLMs for the models this app runs it with (RUN_CONFIG_KWARGS).
+    """
+    import multi_agent
+    from configuration import Configuration
+    multi_agent.warm_llms(Configuration(**dict(RUN_CONFIG_KWARGS)))
+    return multi_agent.get_graph()
+
+# Configuration overrides for every run, as sorted (key, value) pairs so they hash as a cache key.
+# Ensure API keys (OPENAI_API_KEY, TAVILY_API_KEY) are set in your environment.
+RUN_CONFIG_KWARGS = tuple(sorted({
+    "researcher_model": "gpt-4.1",
+    "planner_model": "gpt-4.1",
+    "writer_model": "gpt-4.1",
+    "search_api": "tavily",
+    "max_search_depth": 1, # Keep this low for faster Streamlit interaction initially
+    "number_of_queries": 2,
+}.items()))
+
+@st.cache_data(show_spinner=False)
+def build_config(kwargs_tuple: tuple) -> "RunnableConfig":
+    """
+    Validates the Configuration once per distinct set of overrides, instead of on every run.
+    cache_data hands each run its own copy, so nothing a run does to its config leaks into others.
+    """
+    _, Configuration, _, RunnableConfig = get_graph_and_cfg()
+    config_override = Configuration(**dict(kwargs_tuple))
+    return RunnableConfig(configurable=config_override.model_dump())
+
+@st.cache_resource
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Starts one event loop in a daemon thread, shared by every run across reruns and sessions.
+    All of a run's async work happens on it (the LLM calls and the Tavily searches), so the cached
+    LLM clients and their connection pools outlive a single button click.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="graph-event-loop", daemon=True).start()
+    return loop
+
+async def stream_graph_updates(graph, initial_input: "ReportStateInput", runnable_config: "RunnableConfig", updates: queue.Queue) -> None:
+    """
+    Runs the graph on the background loop and forwards each update chunk to the script thread.
+    Streamlit elements can only be drawn from the script thread, so rendering happens there.
+    A final None marks the end of the stream.
+    Only the channels rendered here are emitted, so sources and intermediate state aren't copied out.
+    """
+    try:
+        async for chunk in graph.astream(
+            initial_input,
+            config=runnable_config,
+            stream_mode="updates",
+            output_keys=STREAM_OUTPUT_KEYS,
+        ):
+            updates.put(chunk)
+    finally:
+        updates.put(None)
 
 # Helper function to run the graph (adapted from run_research.py)
-async def run_graph_for_streamlit(topic: str) -> str | None:
+def run_graph_for_streamlit(topic: str) -> str | None:
     """
-    Runs the multi-agent graph for Streamlit and retrieves the final report.
+    Runs the multi-agent graph for Streamlit on the shared event loop and retrieves the final report.
     """
     st.write(f"Starting research for topic: {topic}...")
     st.info("The graph is now running. Please check the console for detailed print logs from the agent's execution steps. This might take a few minutes.")
 
+    graph, _, ReportStateInput, _ = get_graph_and_cfg()
     initial_input: ReportStateInput = {"topic": topic}
 
-    # Configuration overrides for this specific run.
-    # Ensure API keys (OPENAI_API_KEY, TAVILY_API_KEY) are set in your environment.
     try:
-        config_override = Configuration(
-            researcher_model="gpt-4.1", 
-            planner_model="gpt-4.1",    
-            writer_model="gpt-4.1",     
-            search_api="tavily",        
-            max_search_depth=1, # Keep this low for faster Streamlit interaction initially         
-            number_of_queries=2         
-        )
-        runnable_config = RunnableConfig(configurable=config_override.model_dump())
+        runnable_config = build_config(RUN_CONFIG_KWARGS)
     except Exception as e:
         st.error(f"Error initializing configuration: {e}")
         return None
     
-    final_output_state = None
+    # Sections are rendered here as they complete, before the whole graph finishes
+    placeholder = st.empty()
+    sections_md: dict[str, str] = {}
+    final_report = None
+    updates: queue.Queue = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        stream_graph_updates(graph, initial_input, runnable_config, updates), get_loop()
+    )
     try:
-        # Invoke the graph
+        # Stream per-node updates instead of waiting for the final state
         # The print statements from multi_agent_py_v3 will show up in the console
-        final_output_state = await multi_agent_graph.ainvoke(initial_input, config=runnable_config)
-
-        if final_output_state and isinstance(final_output_state, dict):
-            if 'final_report' in final_output_state and final_output_state['final_report']:
-                st.success("Report generated successfully!")
-                return final_output_state['final_report']
-            else:
-                st.warning("Report generation finished, but the final report is empty or missing.")
-                st.json(final_output_state) # Display the final state for debugging
-                return None
+        with st.status("Running research graph...", expanded=True) as status:
+            while (chunk := updates.get()) is not None:
+                for node_name, update in chunk.items():
+                    status.write(f"Completed step: {node_name}")
+                    if not isinstance(update, dict): # e.g. nodes that only route via Command
+                        continue
+                    for section in update.get("completed_sections") or []:
+                        sections_md[section.name] = section.content
+                        placeholder.markdown("\n\n".join(sections_md.values()))
+                    if update.get("final_report"):
+                        final_report = update["final_report"]
+            future.result() # Re-raises any error from the graph run
+            status.update(label="Research graph finished", state="complete", expanded=False)
+
+        if final_report:
+            st.success("Report generated successfully!")
+            return final_report
         else:
-            st.error("Graph execution did not return a valid final state.")
-            st.write("Final output from graph:", final_output_state)
+            st.warning("Report generation finished, but the final report is empty or missing.")
             return None
             
     except Exception as e:
         st.error(f"An error occurred during agent execution: {str(e)}")
         st.exception(e) # Displays the full traceback in Streamlit
         return None
+    finally:
+        # Don't leave the run going on the shared loop if the script stopped early
+        future.cancel()
+
+@st.fragment
+def render_report(topic: str) -> None:
+    """
+    Shows the generated report and its download button.
+    As a fragment, interacting with it reruns only this function, not the whole script.
+    """
+    if not st.session_state.report:
+        return
+    st.subheader("Generated Report")
+    st.markdown(st.session_state.report)
+    
+    # Add a download button for the report
+    st.download_button(
+        label="Download Report as Markdown",
+        data=st.session_state.report,
+        file_name=f"{topic.replace(' ', '_')}_report.md" if topic else "research_report.md",
+        mime="text/markdown",
+    )
 
 # --- Streamlit App UI ---
 st.set_page_config(layout="wide", page_title="AI Research Report Generator")
@@ -83,6 +187,8 @@ if "error_message" not in st.session_state:
     st.session_state.error_message = None
 if "is_loading" not in st.session_state:
     st.session_state.is_loading = False
+if "report_cache" not in st.session_state:
+    st.session_state.report_cache = {} # Generated reports keyed by normalized topic
 
 # Input for the research topic
 topic_input = st.text_input("Enter the research topic:", placeholder="e.g., The future of AI in healthcare diagnostics")
@@ -93,21 +199,26 @@ if st.button("Generate Report", type="primary", disabled=st.session_state.is_loa
         st.session_state.report = None # Clear previous report
         st.session_state.error_message = None # Clear previous error
 
-        # Use st.spinner for a visual loading indicator
-        with st.spinner("Generating report... This may take several minutes. Please wait."):
-            # Run the asynchronous graph execution
-            # asyncio.run() is suitable here as Streamlit callbacks are synchronous
+        # Reuse the report if this topic was already generated in this session
+        cache_key = topic_input.strip().lower()
+        cached_report = st.session_state.report_cache.get(cache_key)
+        if cached_report:
+            st.session_state.report = cached_report
+        else:
+            # Progress and completed sections are shown live by run_graph_for_streamlit's st.status block
+            # The graph runs on the shared background event loop; this call blocks until it finishes
             try:
-                report_content = asyncio.run(run_graph_for_streamlit(topic_input))
+                report_content = run_graph_for_streamlit(topic_input)
                 if report_content:
                     st.session_state.report = report_content
+                    st.session_state.report_cache[cache_key] = report_content
                 else:
                     # Error messages are handled within run_graph_for_streamlit and displayed using st.error/warning
                     # If it returns None without specific st messages, we add a generic one.
                     if not st.session_state.error_message: # Check if an error was already logged by the function
                          st.session_state.error_message = "Failed to generate report. Check logs for details."
             except Exception as e:
-                # Catch any other unexpected errors from asyncio.run or the function itself
+                # Catch any other unexpected errors from the function itself
                 st.session_state.error_message = f"An unexpected error occurred: {str(e)}"
                 st.exception(e)
         
@@ -121,16 +232,8 @@ if st.session_state.is_loading:
     # This message will be shown briefly before the spinner takes over if rerun happens fast
     st.info("Processing... please wait.") 
 elif st.session_state.report:
-    st.subheader("Generated Report")
-    st.markdown(st.session_state.report)
-    
-    # Add a download button for the report
-    st.download_button(
-        label="Download Report as Markdown",
-        data=st.session_state.report,
-        file_name=f"{topic_input.replace(' ', '_')}_report.md" if topic_input else "research_report.md",
-        mime="text/markdown",
-    )
+    # The generate button above stays outside the fragment so it still triggers a full rerun
+    render_report(topic_input)
 elif st.session_state.error_message:
     # Errors displayed by run_graph_for_streamlit will appear above this if they use st.error directly.
     # This handles cases where the function might return None and set a general error.
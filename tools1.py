@@ -1,9 +1,12 @@
 import os
 import asyncio
-from typing import List, Optional, Dict, Any, Union, Literal # Keep Union if used by Section or other kept items
+import weakref
+from functools import lru_cache
+from typing import Iterator, List, Optional, Dict, Any, Union, Literal # Keep Union if used by Section or other kept items
 
-from dotenv import load_dotenv
+import httpx
 from tavily import AsyncTavilyClient
+from tavily.errors import UsageLimitExceededError, TimeoutError as TavilyTimeoutError
 from langchain_core.tools import tool
 from langsmith import traceable
 
@@ -11,60 +14,29 @@ from langsmith import traceable
 # and defines the 'Section' class. If 'Section' is not used by any kept function,
 # this import and 'format_sections' could also be reviewed.
 # For now, 'format_sections' is kept as a general utility.
-from state import Section
+from state import Section, SourceDoc, SearchAnswer
+import bootstrap # noqa: F401 # Loads the .env file
+from config_utils import get_config_value, get_search_params, split_source_budget # noqa: F401 # Re-exported for existing imports
 
-# Load environment variables from .env file
-load_dotenv()
+# Search results are cached once, by the graph's _cached_search (with a TTL and a size limit);
+# only the client is cached here
+try:
+    import streamlit as st
+    # Shared across reruns and sessions of the Streamlit app
+    _cache_resource = st.cache_resource
+except ImportError:
+    # Outside the Streamlit app, fall back to a plain in-process cache
+    _cache_resource = lru_cache(maxsize=1)
 
-def get_config_value(value: Any) -> Any:
-    """
-    Helper function to handle string, dict, and enum cases of configuration values.
-    Enums are expected to have a 'value' attribute.
-    """
-    if isinstance(value, str):
-        return value
-    elif isinstance(value, dict):
-        return value
-    elif hasattr(value, 'value'): # Check if it's an Enum-like object with a .value
-        return value.value
-    return value # Fallback for other types
-
-def get_search_params(search_api: str, search_api_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-    """
-    Filters the search_api_config dictionary to include only parameters accepted by the specified search API.
-    Currently, only Tavily is supported.
-
-    Args:
-        search_api (str): The search API identifier (should be "tavily").
-        search_api_config (Optional[Dict[str, Any]]): The configuration dictionary for the search API.
-
-    Returns:
-        Dict[str, Any]: A dictionary of parameters to pass to the search function.
-    """
-    # Define accepted parameters for each search API
-    # Simplified to only include Tavily
-    SEARCH_API_PARAMS = {
-        "tavily": ["max_results", "topic", "include_raw_content", "search_depth", "include_answer", "include_images", "include_domains", "exclude_domains"],
-    }
-
-    # Get the list of accepted parameters for the given search API
-    accepted_params = SEARCH_API_PARAMS.get(search_api, [])
+_SECTION_SEP = "=" * 60
 
-    # If no config provided, return an empty dict
-    if not search_api_config:
-        return {}
-
-    # Filter the config to only include accepted parameters
-    return {k: v for k, v in search_api_config.items() if k in accepted_params}
-
-def format_sections(sections: list[Section]) -> str:
-    """ Format a list of sections into a string """
-    formatted_str = ""
+def format_sections_iter(sections: list[Section]) -> Iterator[str]:
+    """ Yield the formatted block of each section, e.g. for streaming consumers """
     for idx, section in enumerate(sections, 1):
-        formatted_str += f"""
-{'='*60}
+        yield f"""
+{_SECTION_SEP}
 Section {idx}: {section.name}
-{'='*60}
+{_SECTION_SEP}
 Description:
 {section.description}
 Requires Research: 
@@ -74,7 +46,45 @@ Content:
 {section.content if section.content else '[Not yet written]'}
 
 """
-    return formatted_str
+
+def format_sections(sections: list[Section]) -> str:
+    """ Format a list of sections into a string """
+    return "".join(format_sections_iter(sections))
+
+@_cache_resource
+def get_tavily_client() -> AsyncTavilyClient:
+    """
+    Returns a Tavily client shared by all searches, instead of constructing one per call.
+    This only saves reading the API key and building the request headers: AsyncTavilyClient opens
+    a new httpx.AsyncClient for every request, so connections are not reused between searches.
+    Because it holds no connections, sharing one instance across event loops is safe.
+    Ensure TAVILY_API_KEY is set in your environment variables.
+    """
+    return AsyncTavilyClient()
+
+# Semaphores limiting in-flight Tavily searches, shared by every caller on the same event loop
+# (e.g. all parallel sections), per concurrency limit. asyncio primitives are bound to one loop.
+_SEARCH_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[int, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+def _get_search_semaphore(max_concurrency: int) -> asyncio.Semaphore:
+    """
+    Returns the semaphore shared by all searches on the running event loop, created on first use.
+    """
+    semaphores = _SEARCH_SEMAPHORES.setdefault(asyncio.get_running_loop(), {})
+    if max_concurrency not in semaphores:
+        semaphores[max_concurrency] = asyncio.Semaphore(max_concurrency)
+    return semaphores[max_concurrency]
+
+def _is_retryable_search_error(error: Exception) -> bool:
+    """
+    Rate limiting, server errors (5xx), timeouts and connection failures are worth retrying.
+    The Tavily client raises its own exceptions for rate limiting (429) and timeouts; invalid keys,
+    bad requests and forbidden responses (InvalidAPIKeyError, BadRequestError, ForbiddenError) are not retried.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, (UsageLimitExceededError, TavilyTimeoutError, httpx.TransportError, TimeoutError))
 
 @traceable
 async def tavily_search_async(
@@ -87,6 +97,8 @@ async def tavily_search_async(
     include_images: bool = False,
     include_domains: Optional[List[str]] = None,
     exclude_domains: Optional[List[str]] = None,
+    max_concurrency: int = 8,
+    max_retries: int = 2,
 ) -> List[Dict[str, Any]]:
     """
     Performs concurrent web searches with the Tavily API.
@@ -101,10 +113,13 @@ async def tavily_search_async(
         include_images (bool): Whether to include images in the results.
         include_domains (Optional[List[str]]): A list of domains to exclusively search for.
         exclude_domains (Optional[List[str]]): A list of domains to exclude from search.
+        max_concurrency (int): Maximum number of searches in flight at once, across all concurrent callers.
+        max_retries (int): Retries per query on rate limiting, server errors and timeouts, with exponential backoff.
 
 
     Returns:
-        List[dict]: List of search responses from Tavily API:
+        List[dict]: List of search responses from Tavily API, one per non-blank query
+        (empty or whitespace-only queries are skipped):
             [
                 {
                     'query': str,
@@ -125,27 +140,42 @@ async def tavily_search_async(
                 ...
             ]
     """
-    # Initialize the asynchronous Tavily client
-    # It's generally better to initialize the client once if possible,
-    # but for a standalone function, this is acceptable.
-    # Ensure TAVILY_API_KEY is set in your environment variables.
-    tavily_async_client = AsyncTavilyClient()
-    search_tasks = []
-
-    for query in search_queries:
-        search_tasks.append(
-            tavily_async_client.search(
-                query=query,
-                search_depth=search_depth,
-                include_answer=include_answer,
-                include_images=include_images,
-                max_results=max_results,
-                include_raw_content=include_raw_content,
-                topic=topic,
-                include_domains=include_domains,
-                exclude_domains=exclude_domains
-            )
-        )
+    # Nothing to search: skip building the parameters, tasks and gather entirely
+    queries = [q for q in search_queries if q and q.strip()]
+    if not queries:
+        return []
+
+    search_params = {
+        "search_depth": search_depth,
+        "include_answer": include_answer,
+        "include_images": include_images,
+        "max_results": max_results,
+        "include_raw_content": include_raw_content,
+        "topic": topic,
+        "include_domains": include_domains,
+        "exclude_domains": exclude_domains
+    }
+
+    # Search each distinct query once, preserving first-seen order
+    unique_queries = list(dict.fromkeys(queries))
+
+    # Searches run concurrently on the caller's event loop (the app's persistent loop under Streamlit),
+    # but at most max_concurrency at a time across all callers (e.g. parallel sections, each with a
+    # few queries) to stay clear of the API's rate limits
+    semaphore = _get_search_semaphore(max_concurrency)
+
+    async def bounded_search(query: str) -> Dict[str, Any]:
+        for attempt in range(max_retries + 1):
+            try:
+                async with semaphore:
+                    return await get_tavily_client().search(query=query, **search_params)
+            except Exception as e:
+                if attempt == max_retries or not _is_retryable_search_error(e):
+                    raise
+                # Back off outside the semaphore so a retrying query doesn't hold a slot
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    search_tasks = [bounded_search(query) for query in unique_queries]
 
     # Execute all searches concurrently
     try:
@@ -161,9 +191,11 @@ async def tavily_search_async(
                 "follow_up_questions": None, 
                 "answer": None, 
                 "images": None
-            } for q in search_queries
+            } for q in queries
         ]
-    return search_docs
+    # Fan the results back out so duplicates get the same response, in the original order
+    result_map = dict(zip(unique_queries, search_docs))
+    return [result_map[q] for q in queries]
 
 
 @tool
@@ -175,7 +207,9 @@ async def tavily_search(
     include_answer: bool = False,
     include_images: bool = False,
     include_domains: Optional[List[str]] = None,
-    exclude_domains: Optional[List[str]] = None
+    exclude_domains: Optional[List[str]] = None,
+    per_source_char_cap: int = 4000,
+    total_char_budget: int = 60000
 ) -> str:
     """
     Fetches results from Tavily search API and formats them into a string.
@@ -190,6 +224,9 @@ async def tavily_search(
         include_images (bool): Whether to include images in the results.
         include_domains (Optional[List[str]]): A list of domains to exclusively search for.
         exclude_domains (Optional[List[str]]): A list of domains to exclude from search.
+        per_source_char_cap (int): Maximum number of raw content characters to include per source.
+        total_char_budget (int): Maximum number of raw content characters across all sources;
+            see format_source_docs.
 
     Returns:
         str: A formatted string of search results, deduplicated by URL.
@@ -207,38 +244,149 @@ async def tavily_search(
         exclude_domains=exclude_domains
     )
 
-    formatted_output = "Search results:\n\n"
-    
-    # Deduplicate results by URL across all query responses
-    unique_results_by_url: Dict[str, Dict[str, Any]] = {}
+    # Convert to source documents and share the graph's formatting
+    source_docs: List[Union[SourceDoc, SearchAnswer]] = []
+    search_errors: Dict[str, str] = {}
     for response in search_responses:
         if response.get("error"):
-            formatted_output += f"Error for query '{response['query']}': {response['error']}\n\n"
+            search_errors[response["query"]] = response["error"]
+            continue
+        source_docs.extend(response_to_source_docs(response["query"], response))
+
+    return format_source_docs(
+        source_docs,
+        per_source_char_cap=per_source_char_cap,
+        total_char_budget=total_char_budget,
+        search_errors=search_errors,
+    )
+
+
+def response_to_source_docs(query: str, response: Dict[str, Any]) -> List[Union[SourceDoc, SearchAnswer]]:
+    """
+    Converts one Tavily search response into its direct answer (if any) followed by its source documents.
+    """
+    docs: List[Union[SourceDoc, SearchAnswer]] = []
+    if response.get("answer"):
+        docs.append(SearchAnswer(query=query, answer=response["answer"]))
+    docs.extend(
+        SourceDoc(
+            query=query,
+            url=result["url"],
+            title=result.get("title") or "N/A",
+            content=result.get("content") or "N/A", # 'content' is the summary from Tavily
+            raw_content=result.get("raw_content"),
+            score=result.get("score") or 0.0,
+        )
+        for result in response.get("results", [])
+        if result.get("url")
+    )
+    return docs
+
+
+def format_source_docs(
+    source_docs: List[Union[SourceDoc, SearchAnswer]],
+    per_source_char_cap: int = 4000,
+    total_char_budget: int = 60000,
+    search_errors: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Formats source documents and direct answers into a single string, deduplicated by URL.
+    Errors and direct answers are listed first, followed by the sources.
+
+    Args:
+        source_docs (List[Union[SourceDoc, SearchAnswer]]): Source documents and direct answers,
+            e.g. accumulated over several searches.
+        per_source_char_cap (int): Maximum number of raw content characters to include per source.
+        total_char_budget (int): Maximum number of raw content characters across all sources.
+            It is spent on the most recently added sources first; older sources past the budget are left out.
+        search_errors (Optional[Dict[str, str]]): Error message per failed query, listed before the sources.
+
+    Returns:
+        str: A formatted string of the unique sources.
+    """
+    # Deduplicate sources by URL, tracking seen URLs in a set and keeping the first source
+    # per URL in insertion order (answers are deduplicated by query)
+    answers: Dict[str, str] = {}
+    seen_urls: set[str] = set()
+    unique_docs: List[SourceDoc] = []
+    for doc in source_docs:
+        if isinstance(doc, SearchAnswer):
+            answers.setdefault(doc.query, doc.answer)
+        elif doc.url not in seen_urls:
+            seen_urls.add(doc.url)
+            unique_docs.append(doc)
+
+    # Return before building the header, so callers don't pass a padded, near-empty blob to the LLM
+    if not unique_docs and not answers:
+        return "No valid search results or answers found. Please try different search queries."
+
+    # Collect output chunks and join once at the end, rather than growing one string with +=
+    parts = ["Search results:\n\n"]
+    for query, error in (search_errors or {}).items():
+        parts.append(f"Error for query '{query}': {error}\n\n")
+    for query, answer in answers.items():
+        parts.append(f"Direct Answer for query '{query}': {answer}\n\n")
+
+    # Spend the raw content budget newest-first: sources are appended per search, so the
+    # follow-up sources from later reflection passes are at the end and shouldn't be cut first
+    remaining = total_char_budget
+    first_kept = len(unique_docs)
+    raw_caps: List[int] = [0] * len(unique_docs) # Raw content characters to include, per source
+    while first_kept > 0 and remaining > 0:
+        first_kept -= 1
+        cap = min(per_source_char_cap, remaining)
+        raw_caps[first_kept] = cap
+        remaining -= min(len(unique_docs[first_kept].raw_content or ""), cap)
+
+    # Format the kept (newest) sources in their original order
+    for i, (doc, cap) in enumerate(zip(unique_docs[first_kept:], raw_caps[first_kept:]), 1):
+        parts.append(f"\n\n--- SOURCE {i}: {doc.title} ---\n")
+        parts.append(f"URL: {doc.url}\n\n")
+        parts.append(f"SUMMARY:\n{doc.content}\n\n")
+        if doc.raw_content:
+            parts.append(f"FULL CONTENT (preview):\n{doc.raw_content[:cap]}")
+            if len(doc.raw_content) > cap:
+                parts.append("...")
+        parts.append("\n\n" + "-" * 80 + "\n")
+
+    return "".join(parts).strip()
+
+
+async def search_source_docs(search_api: str, query_list: list[str], params_to_pass: dict) -> Dict[str, List[Union[SourceDoc, SearchAnswer]]]:
+    """
+    Execute searches with the selected search API and return the results as source documents
+    (preceded by the query's direct answer, when include_answer is set).
+    Currently, only Tavily search is supported.
+
+    Args:
+        search_api (str): Name of the search API to use (should be "tavily").
+        query_list (list[str]): List of search queries to execute.
+        params_to_pass (dict): Parameters to pass to the search API.
+
+    Returns:
+        Dict[str, List[Union[SourceDoc, SearchAnswer]]]: Source documents per query. Queries whose search failed are omitted.
+
+    Raises:
+        ValueError: If an unsupported search API is specified.
+    """
+    print(f"Executing search for API: {search_api}, Queries: {query_list}, Params: {params_to_pass}")
+    if search_api != "tavily":
+        raise ValueError(f"Unsupported search API: {search_api}. Only 'tavily' is currently supported.")
+
+    # Raw content is always requested, as in tavily_search, since the writers use it as source material
+    # tavily_search_async skips blank queries, so drop them here too to keep responses aligned
+    query_list = [q for q in query_list if q and q.strip()]
+    # Source budget parameters only apply when formatting, so they're not passed to the search
+    search_params, _ = split_source_budget(params_to_pass)
+    search_responses = await tavily_search_async(query_list, **{**search_params, "include_raw_content": True})
+
+    docs_by_query: Dict[str, List[Union[SourceDoc, SearchAnswer]]] = {}
+    for query, response in zip(query_list, search_responses):
+        if response.get("error"):
+            print(f"Search failed for query '{query}': {response['error']}")
             continue
-        if response.get("answer"):
-             formatted_output += f"Direct Answer for query '{response['query']}': {response['answer']}\n\n"
-
-        for result in response.get('results', []):
-            url = result.get('url')
-            if url and url not in unique_results_by_url:
-                unique_results_by_url[url] = result
-    
-    if not unique_results_by_url:
-        if not any(res.get("answer") for res in search_responses if not res.get("error")): # Check if there was any answer
-             return "No valid search results or answers found. Please try different search queries."
-
-    # Format the unique results
-    for i, (url, result) in enumerate(unique_results_by_url.items(), 1):
-        formatted_output += f"\n\n--- SOURCE {i}: {result.get('title', 'N/A')} ---\n"
-        formatted_output += f"URL: {url}\n\n"
-        formatted_output += f"SUMMARY:\n{result.get('content', 'N/A')}\n\n" # 'content' is the summary from Tavily
-        if result.get('raw_content'):
-            # Limit raw_content display length for brevity in the final string output
-            raw_content_preview = result['raw_content'][:10000] + ("..." if len(result['raw_content']) > 10000 else "")
-            formatted_output += f"FULL CONTENT (preview):\n{raw_content_preview}"
-        formatted_output += "\n\n" + "-" * 80 + "\n"
-    
-    return formatted_output.strip()
+        docs_by_query[query] = response_to_source_docs(query, response)
+    return docs_by_query
 
 
 async def select_and_execute_search(search_api: str, query_list: list[str], params_to_pass: dict) -> str: